@@ -1,6 +1,71 @@
 import random
 import numpy as np
 from sudo import initialize_structures
+from solver_core import HAVE_NUMBA, njit
+
+def count_bits(masks):
+    """Number of set bits in each row of a contiguous uint32 mask array, summed over the last axis."""
+    return np.unpackbits(masks.view(np.uint8), axis=-1).sum(axis=-1)
+
+@njit(cache=True)
+def seed_kernels(seed):
+    """Seed the random stream used inside the compiled kernels."""
+    np.random.seed(seed)
+
+@njit(cache=True)
+def _penalty(solution):
+    """Number of repeated digits over all rows and columns of a filled grid."""
+    size = solution.shape[0]
+    penalty = 2 * size * size
+    for i in range(size):
+        row_mask = 0
+        col_mask = 0
+        for j in range(size):
+            row_mask |= 1 << (int(solution[i, j]) - 1)
+            col_mask |= 1 << (int(solution[j, i]) - 1)
+        while row_mask:
+            row_mask &= row_mask - 1
+            penalty -= 1
+        while col_mask:
+            col_mask &= col_mask - 1
+            penalty -= 1
+    return penalty
+
+@njit(cache=True)
+def _neighbor_search(current, neighbor, fixed, subgrid_rows, subgrid_cols):
+    """Move a random free cell of current towards neighbor, swapping within its block."""
+    size = current.shape[0]
+    new_solution = current.copy()
+    while True:
+        row = np.random.randint(0, size)
+        col = np.random.randint(0, size)
+        if not fixed[row, col]:
+            break
+    
+    block_row = (row // subgrid_rows) * subgrid_rows
+    block_col = (col // subgrid_cols) * subgrid_cols
+    
+    x_ij = int(current[row, col])
+    x_kj = int(neighbor[row, col])
+    v_ij = int(round(x_ij + np.random.random() * abs(x_ij - x_kj)))
+    
+    if v_ij > size:
+        v_ij = (v_ij % size) + 1
+    elif v_ij < 1:
+        v_ij = size - (abs(v_ij) % size)
+    
+    found = False
+    for r in range(block_row, block_row + subgrid_rows):
+        for c in range(block_col, block_col + subgrid_cols):
+            if current[r, c] == v_ij:
+                found = True
+                if not fixed[r, c]:
+                    new_solution[r, c] = x_ij
+                    new_solution[row, col] = v_ij
+                    return new_solution
+    if not found:
+        new_solution[row, col] = v_ij
+    return new_solution
 
 class ABCSolver:
     def __init__(self, puzzle_input, size=9, population_size=50):
@@ -8,9 +73,12 @@ class ABCSolver:
         (self.rows, self.cols, self.squares, self.unitlist, 
          self.units, self.peers, self.subgrid_rows, 
          self.subgrid_cols, self.digits) = initialize_structures(size)
+        # Bit v-1 stands for digit v; empty cells (0) map to no bit
+        self.digit_bits = np.array([0] + [1 << i for i in range(size)], dtype=np.uint32)
         
         self.grid = self.parse_input(puzzle_input)
         self.fixed_cells = (self.grid != 0)
+        self._block_templates = self.block_templates()
         
         self.max_cycles = 100000
         self.population_size = population_size
@@ -18,11 +86,13 @@ class ABCSolver:
         self.onlooker_bees = self.employed_bees * 2
         self.scout_limit = 10
         
+        # One contiguous (bees, size, size) tensor rather than a list of grids
         self.population = self.initialize_population()
-        self.fitnesses = [self.evaluate(sol) for sol in self.population]
-        self.best_solution = max(self.population, key=lambda x: self.evaluate(x))
-        self.best_fitness = self.evaluate(self.best_solution)
-        self.trials = [0] * self.employed_bees
+        self.fitnesses = self.evaluate_all(self.population).tolist()
+        best = int(np.argmax(self.fitnesses))
+        self.best_solution = self.population[best].copy()
+        self.best_fitness = self.fitnesses[best]
+        self.trials = np.zeros(self.employed_bees, dtype=np.int32)
 
     def parse_input(self, puzzle_input):
         grid = np.zeros((self.size, self.size), dtype=int)
@@ -36,129 +106,107 @@ class ABCSolver:
             grid = np.array(puzzle_input, dtype=int)
         return grid
 
-    def initialize_population(self):
-        population = []
-        for _ in range(self.employed_bees):
-            solution = self.grid.copy()
-            for box_r in range(0, self.size, self.subgrid_rows):
-                for box_c in range(0, self.size, self.subgrid_cols):
-                    existing = set()
-                    for r in range(box_r, box_r + self.subgrid_rows):
-                        for c in range(box_c, box_c + self.subgrid_cols):
-                            if self.fixed_cells[r, c]:
-                                existing.add(solution[r, c])
-                    
-                    missing = [i+1 for i in range(self.size) if (i+1) not in existing]
-                    random.shuffle(missing)
-                    
-                    idx = 0
-                    for r in range(box_r, box_r + self.subgrid_rows):
-                        for c in range(box_c, box_c + self.subgrid_cols):
-                            if not self.fixed_cells[r, c]:
-                                solution[r, c] = missing[idx]
-                                idx += 1
-            population.append(solution)
+    def block_templates(self):
+        """Per block: the digits its fixed cells leave missing and the (rows, cols) of its free cells."""
+        templates = []
+        for box_r in range(0, self.size, self.subgrid_rows):
+            for box_c in range(0, self.size, self.subgrid_cols):
+                box = (slice(box_r, box_r + self.subgrid_rows), 
+                       slice(box_c, box_c + self.subgrid_cols))
+                existing = int(np.bitwise_or.reduce(
+                    self.digit_bits[self.grid[box][self.fixed_cells[box]]]))
+                
+                missing = np.array([v for v in range(1, self.size + 1) 
+                                    if not existing & self.digit_bits[v]], dtype=np.uint8)
+                free_r, free_c = np.nonzero(~self.fixed_cells[box])
+                templates.append((missing, free_r + box_r, free_c + box_c))
+        return templates
+
+    def initialize_population(self, count=None):
+        count = self.employed_bees if count is None else count
+        population = np.empty((count, self.size, self.size), dtype=np.uint8)
+        population[:] = self.grid
+        for missing, free_r, free_c in self._block_templates:
+            # An independent random permutation of the missing digits for every bee
+            order = np.argsort(np.random.random((count, len(missing))), axis=1)
+            population[:, free_r, free_c] = missing[order]
         return population
 
     def evaluate(self, solution):
-        penalty = 0
-        for row in solution:
-            penalty += self.size - len(set(row))
-        for col in solution.T:
-            penalty += self.size - len(set(col))
+        if HAVE_NUMBA:
+            return 1 / (1 + _penalty(solution))
+        return float(self.evaluate_all(solution[np.newaxis])[0])
+
+    def evaluate_all(self, population):
+        """Fitness of every bee in a (bees, size, size) tensor in one vectorized pass."""
+        masks = self.digit_bits[population]
+        row_or = np.bitwise_or.reduce(masks, axis=2)
+        col_or = np.bitwise_or.reduce(masks, axis=1)
+        penalty = 2 * self.size**2 - count_bits(row_or) - count_bits(col_or)
         return 1 / (1 + penalty)
 
-    def neighbor_search(self, current_solution):
-        new_solution = current_solution.copy()
-        while True:
-            row = random.randint(0, self.size-1)
-            col = random.randint(0, self.size-1)
-            if not self.fixed_cells[row, col]:
-                break
-        
-        block_row = (row // self.subgrid_rows) * self.subgrid_rows
-        block_col = (col // self.subgrid_cols) * self.subgrid_cols
+    def neighbor_search(self, i):
+        # Uniform pick among the other bees: draw from pop-1 slots and skip over i
+        k = random.randrange(self.employed_bees - 1)
+        if k >= i:
+            k += 1
         
-        neighbor_solution = random.choice(self.population)
-        while np.array_equal(neighbor_solution, current_solution):
-            neighbor_solution = random.choice(self.population)
-        
-        x_ij = current_solution[row, col]
-        x_kj = neighbor_solution[row, col]
-        v_ij = x_ij + random.random() * abs(x_ij - x_kj)
-        v_ij = int(round(v_ij))
-        
-        if v_ij > self.size:
-            v_ij = (v_ij % self.size) + 1
-        elif v_ij < 1:
-            v_ij = self.size - (abs(v_ij) % self.size)
-        
-        block = current_solution[block_row:block_row+self.subgrid_rows, 
-                               block_col:block_col+self.subgrid_cols]
-        if v_ij in block:
-            positions = np.argwhere(block == v_ij)
-            for pos in positions:
-                swap_r, swap_c = pos
-                abs_r = block_row + swap_r
-                abs_c = block_col + swap_c
-                if not self.fixed_cells[abs_r, abs_c]:
-                    new_solution[abs_r, abs_c] = x_ij
-                    new_solution[row, col] = v_ij
-                    break
-        else:
-            new_solution[row, col] = v_ij
-        
-        return new_solution
+        return _neighbor_search(self.population[i], self.population[k], self.fixed_cells,
+                                self.subgrid_rows, self.subgrid_cols)
 
-    def solve(self):
-        for cycle in range(self.max_cycles):
-            if self.best_fitness == 1:
-                yield self.best_solution, 1.0
-                return
+    def step(self):
+        """Run one employed/onlooker/scout cycle and return the best (solution, fitness)."""
+        # Employed bees phase
+        for i in range(self.employed_bees):
+            neighbor = self.neighbor_search(i)
+            neighbor_fit = self.evaluate(neighbor)
+            
+            if neighbor_fit >= self.fitnesses[i]:
+                self.population[i] = neighbor
+                self.fitnesses[i] = neighbor_fit
+                self.trials[i] = 0
+            else:
+                self.trials[i] += 1
                 
-            # Employed bees phase
-            for i in range(self.employed_bees):
-                neighbor = self.neighbor_search(self.population[i])
+            if neighbor_fit >= self.best_fitness:
+                self.best_solution = neighbor.copy()
+                self.best_fitness = neighbor_fit
+        
+        # Onlooker bees phase
+        # Share all onlookers out in proportion to fitness with a single draw
+        probabilities = np.asarray(self.fitnesses)
+        counts = np.random.multinomial(self.onlooker_bees, probabilities / probabilities.sum())
+        for i, k in enumerate(counts):
+            for _ in range(k):
+                neighbor = self.neighbor_search(i)
                 neighbor_fit = self.evaluate(neighbor)
                 
                 if neighbor_fit >= self.fitnesses[i]:
                     self.population[i] = neighbor
                     self.fitnesses[i] = neighbor_fit
                     self.trials[i] = 0
-                else:
-                    self.trials[i] += 1
-                    
+                        
                 if neighbor_fit >= self.best_fitness:
                     self.best_solution = neighbor.copy()
                     self.best_fitness = neighbor_fit
+        
+        # Scout bees phase
+        if self.trials.max() > self.scout_limit:
+            idx = int(self.trials.argmax())
+            self.population[idx] = self.initialize_population(1)[0]
+            self.fitnesses[idx] = self.evaluate(self.population[idx])
+            self.trials[idx] = 0
             
-            # Onlooker bees phase
-            sum_fitness = sum(self.fitnesses)
-            if sum_fitness > 0:
-                for i in range(self.employed_bees):
-                    probability = self.fitnesses[i] / sum_fitness
-                    for _ in range(int(probability * self.onlooker_bees)):
-                        neighbor = self.neighbor_search(self.population[i])
-                        neighbor_fit = self.evaluate(neighbor)
-                        
-                        if neighbor_fit >= self.fitnesses[i]:
-                            self.population[i] = neighbor
-                            self.fitnesses[i] = neighbor_fit
-                            self.trials[i] = 0
-                            
-                        if neighbor_fit >= self.best_fitness:
-                            self.best_solution = neighbor.copy()
-                            self.best_fitness = neighbor_fit
-            
-            # Scout bees phase
-            if max(self.trials) > self.scout_limit:
-                idx = self.trials.index(max(self.trials))
-                self.population[idx] = self.initialize_population()[0]
-                self.fitnesses[idx] = self.evaluate(self.population[idx])
-                self.trials[idx] = 0
-                
-                if self.fitnesses[idx] >= self.best_fitness:
-                    self.best_solution = self.population[idx].copy()
-                    self.best_fitness = self.fitnesses[idx]
+            if self.fitnesses[idx] >= self.best_fitness:
+                self.best_solution = self.population[idx].copy()
+                self.best_fitness = self.fitnesses[idx]
+        
+        return self.best_solution, self.best_fitness
+
+    def solve(self):
+        for cycle in range(self.max_cycles):
+            if self.best_fitness == 1:
+                yield self.best_solution, 1.0
+                return
             
-            yield self.best_solution, self.best_fitness
\ No newline at end of file
+            yield self.step()
\ No newline at end of file
@@ -8,6 +8,14 @@ class ACOSolver:
         (self.rows, self.cols, self.squares, self.unitlist, 
          self.units, self.peers, self.subgrid_rows, 
          self.subgrid_cols, self.digits) = initialize_structures(size)
+        self._sq_idx = {s: i for i, s in enumerate(self.squares)}
+        self._dig_idx = {d: i for i, d in enumerate(self.digits)}
+        # Candidates are bitmasks per square index, laid out as in sudo.Ctx
+        self._all_digits = (1 << self.size) - 1
+        self._peer_idx = [tuple(self._sq_idx[p] for p in self.peers[s]) for s in self.squares]
+        self._unit_idx = [tuple(tuple(self._sq_idx[u_s] for u_s in u) for u in self.units[s]) 
+                          for s in self.squares]
+        self._mask_indices = {}
         
         self.num_ants = num_ants
         self.evaporation_rate = evaporation_rate
@@ -22,46 +30,63 @@ class ACOSolver:
         self.best_pheromone_to_add = 0
         self.best_solution = None
         self.best_fixed = 0
+        self._best_cells = np.empty(0, dtype=np.intp)
+        self._best_values = np.empty(0, dtype=np.intp)
 
     def _initialize_values(self, grid):
-        values = {s: self.digits.copy() for s in self.squares}
+        values = [self._all_digits] * (self.size**2)
         for s, d in grid.items():
-            if d in self.digits:
-                values = self._assign_value(values, s, d)
+            if d in self._dig_idx:
+                values = self._assign_value(values, self._sq_idx[s], 1 << self._dig_idx[d])
                 if values is False:
                     return False
         return values
 
-    def _assign_value(self, values, s, d):
-        other_values = [v for v in values[s] if v != d]
-        for v in other_values:
-            values = self._eliminate_value(values, s, v)
+    def _candidate_indices(self, mask):
+        """Digit indices set in a candidate bitmask, cached per distinct mask"""
+        indices = self._mask_indices.get(mask)
+        if indices is None:
+            indices = np.array([k for k in range(self.size) if mask >> k & 1], dtype=np.intp)
+            self._mask_indices[mask] = indices
+        return indices
+
+    def _to_dict(self, values):
+        """Convert bitmask values to {square: digit} for the solved squares"""
+        return {s: self.digits[v.bit_length() - 1] 
+                for s, v in zip(self.squares, values) if not v & (v - 1)}
+
+    def _assign_value(self, values, i, bit):
+        other_values = values[i] & ~bit
+        while other_values:
+            v = other_values & -other_values
+            other_values ^= v
+            values = self._eliminate_value(values, i, v)
             if values is False:
                 return False
         return values
 
-    def _eliminate_value(self, values, s, d):
-        if d not in values[s]:
+    def _eliminate_value(self, values, i, bit):
+        if not values[i] & bit:
             return values
         
-        values[s].remove(d)
+        values[i] ^= bit
         
-        if not values[s]:
+        if not values[i]:
             return False
         
-        if len(values[s]) == 1:
-            d2 = values[s][0]
-            for s2 in self.peers[s]:
-                values = self._eliminate_value(values, s2, d2)
+        if not values[i] & (values[i] - 1):
+            bit2 = values[i]
+            for i2 in self._peer_idx[i]:
+                values = self._eliminate_value(values, i2, bit2)
                 if values is False:
                     return False
         
-        for u in self.units[s]:
-            dplaces = [s for s in u if d in values[s]]
+        for u in self._unit_idx[i]:
+            dplaces = [i2 for i2 in u if values[i2] & bit]
             if len(dplaces) == 0:
                 return False
             if len(dplaces) == 1:
-                values = self._assign_value(values, dplaces[0], d)
+                values = self._assign_value(values, dplaces[0], bit)
                 if values is False:
                     return False
         return values
@@ -70,34 +95,39 @@ class ACOSolver:
         while True:
             ants = []
             for _ in range(self.num_ants):
-                ant_values = {s: self.values[s].copy() for s in self.squares}
+                ant_values = self.values.copy()
                 ants.append({'values': ant_values, 'fixed': 0, 'solution': {}, 'valid': True})
             
-            starting_cells = random.sample(self.squares, self.num_ants)
+            starting_cells = random.sample(range(self.size**2), self.num_ants)
             for i, ant in enumerate(ants):
                 ant['current_cell'] = starting_cells[i]
             
             for _ in range(self.size**2):
+                step_cells, step_values = [], []
                 for ant in ants:
                     if not ant['valid']:
                         continue
                         
-                    s = ant['current_cell']
+                    cell_idx = ant['current_cell']
+                    mask = ant['values'][cell_idx]
                     
-                    if len(ant['values'][s]) > 1:
-                        chosen_value = self._choose_value(ant['values'], s, self.squares.index(s))
-                        new_values = self._assign_value(ant['values'].copy(), s, chosen_value)
+                    if mask & (mask - 1):
+                        value_idx = self._choose_value(ant['values'], cell_idx)
+                        new_values = self._assign_value(ant['values'].copy(), cell_idx, 1 << value_idx)
                         if new_values is False:
                             ant['valid'] = False
                             continue
                             
                         ant['values'] = new_values
-                        ant['solution'][s] = chosen_value
-                        self._local_pheromone_update(self.squares.index(s), self.digits.index(chosen_value))
+                        ant['solution'][self.squares[cell_idx]] = self.digits[value_idx]
+                        step_cells.append(cell_idx)
+                        step_values.append(value_idx)
                     
-                    ant['fixed'] = sum(1 for s in self.squares if len(ant['values'][s]) == 1)
-                    current_index = self.squares.index(ant['current_cell'])
-                    ant['current_cell'] = self.squares[(current_index + 1) % (self.size**2)]
+                    ant['fixed'] = sum(1 for v in ant['values'] if not v & (v - 1))
+                    ant['current_cell'] = (cell_idx + 1) % (self.size**2)
+                
+                if step_cells:
+                    self._local_pheromone_update(step_cells, step_values)
             
             valid_ants = [ant for ant in ants if ant['valid']]
             if not valid_ants:
@@ -109,6 +139,9 @@ class ACOSolver:
             if iteration_best['fixed'] >= self.best_fixed:
                 self.best_fixed = iteration_best['fixed']
                 self.best_solution = iteration_best['values']
+                solved = [(i, v.bit_length() - 1) for i, v in enumerate(self.best_solution) if not v & (v - 1)]
+                self._best_cells = np.array([i for i, _ in solved], dtype=np.intp)
+                self._best_values = np.array([k for _, k in solved], dtype=np.intp)
                 delta_tau = (self.size**2) / (self.size**2 - self.best_fixed + 1e-6)
                 if delta_tau > self.best_pheromone_to_add:
                     self.best_pheromone_to_add = delta_tau
@@ -116,42 +149,47 @@ class ACOSolver:
             self._global_pheromone_update()
             self.best_pheromone_to_add *= (1 - self.bve_rate)
 
-            yield self.best_solution, self.best_fixed / (self.size**2)
+            yield self._to_dict(self.best_solution), self.best_fixed / (self.size**2)
             
             if self.best_fixed == self.size**2:
                 break
         
-        yield self.best_solution, 1.0
+        yield self._to_dict(self.best_solution), 1.0
     
-    def _choose_value(self, values, s, cell_idx):
-        possible_values = [d for d in values[s] if d in self.digits]
+    def _choose_value(self, values, cell_idx):
+        """Pick a digit index for a cell from its remaining candidates"""
+        possible_values = self._candidate_indices(values[cell_idx])
         if len(possible_values) == 1:
-            return possible_values[0]
+            return int(possible_values[0])
         
-        pheromone_levels = [self.pheromone[cell_idx, self.digits.index(d)] for d in possible_values]
+        pheromone_levels = self.pheromone[cell_idx, possible_values]
         
         if random.random() < self.greediness:
             chosen_index = np.argmax(pheromone_levels)
         else:
-            total = sum(pheromone_levels)
-            probabilities = [p/total for p in pheromone_levels]
-            chosen_index = np.random.choice(len(possible_values), p=probabilities)
+            # Roulette wheel: find where a uniform draw lands on the cumulative weights
+            cdf = np.cumsum(pheromone_levels)
+            chosen_index = np.searchsorted(cdf, random.random() * cdf[-1], side='right')
         
-        return possible_values[chosen_index]
+        return int(possible_values[chosen_index])
     
-    def _local_pheromone_update(self, cell_idx, value_idx):
+    def _local_pheromone_update(self, cell_indices, value_indices):
+        """Apply the local update once for every (cell, value) choice made in a step"""
         xi = 0.1
         tau0 = 1.0 / (self.size**2)
-        self.pheromone[cell_idx, value_idx] = (1 - xi) * self.pheromone[cell_idx, value_idx] + xi * tau0
+        flat = np.asarray(cell_indices) * self.size + np.asarray(value_indices)
+        flat, visits = np.unique(flat, return_counts=True)
+        cells, values = np.divmod(flat, self.size)
+        # k repeated updates tau <- (1-xi)*tau + xi*tau0 collapse to a single (1-xi)**k decay
+        decay = (1 - xi) ** visits
+        self.pheromone[cells, values] = decay * self.pheromone[cells, values] + (1 - decay) * tau0
     
     def _global_pheromone_update(self):
         if not self.best_solution or self.best_pheromone_to_add <= 0:
             return
         
-        for cell_idx, s in enumerate(self.squares):
-            if s in self.best_solution and len(self.best_solution[s]) == 1:
-                value = self.digits.index(self.best_solution[s])
-                self.pheromone[cell_idx, value] = (
-                    (1 - self.evaporation_rate) * self.pheromone[cell_idx, value] + 
-                    self.evaporation_rate * self.best_pheromone_to_add
-                )
\ No newline at end of file
+        cells, values = self._best_cells, self._best_values
+        self.pheromone[cells, values] = (
+            (1 - self.evaporation_rate) * self.pheromone[cells, values] + 
+            self.evaporation_rate * self.best_pheromone_to_add
+        )
\ No newline at end of file
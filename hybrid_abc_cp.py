@@ -1,7 +1,6 @@
 import random
 import numpy as np
-from copy import deepcopy
-from sudo import initialize_structures, assign, eliminate
+from sudo import initialize_structures, solver_context, assign
 
 class HybridABCSolver:
     def __init__(self, puzzle_dict, size=9):
@@ -9,9 +8,11 @@ class HybridABCSolver:
         (self.rows, self.cols, self.squares, self.unitlist, 
          self.units, self.peers, self.subgrid_rows, 
          self.subgrid_cols, self.digits) = initialize_structures(size)
+        # Candidates are the bitmask lists of sudo.Ctx, propagated with sudo.assign
+        self.ctx = solver_context(size)
         
         self.puzzle = self.dict_to_values(puzzle_dict)
-        self.fixed_cells = {s for s in self.squares if len(self.puzzle[s]) == 1}
+        self.fixed_cells = {i for i, v in enumerate(self.puzzle) if not v & (v - 1)}
         self.max_cycles = 1000
         self.employed_bees = 10
         self.onlooker_bees = 20
@@ -21,57 +22,76 @@ class HybridABCSolver:
         self.fitnesses = [self.evaluate(sol) for sol in self.population]
         self.best_solution = self.population[np.argmax(self.fitnesses)]
         self.best_fitness = max(self.fitnesses)
-        self.trials = [0] * self.employed_bees
+        self.trials = np.zeros(self.employed_bees, dtype=np.int32)
 
     def dict_to_values(self, puzzle_dict):
-        values = {s: self.digits.copy() for s in self.squares}
+        # Initialisation never branches, so every given is propagated into one list in place
+        values = [(1 << self.size) - 1] * len(self.squares)
         for s, d in puzzle_dict.items():
-            if d in self.digits:
-                values = assign(values.copy(), s, d, self.size, self.units, self.peers)
+            if d in self.digits and not assign(values, self.ctx.sq_index[s], self.ctx.digit_to_bit[d],
+                                               self.ctx.peers):
+                raise ValueError("Invalid initial puzzle")
         return values
 
+    def to_dict(self, values):
+        """Convert bitmask values to {square: digit}, with '.' for unsolved squares"""
+        return {s: self.digits[v.bit_length() - 1] if not v & (v - 1) else '.'
+                for s, v in zip(self.squares, values)}
+
+    def candidates(self, mask):
+        """Split a candidate bitmask into its single-digit bits"""
+        bits = []
+        while mask:
+            bit = mask & -mask
+            bits.append(bit)
+            mask ^= bit
+        return bits
+
     def create_cp_solution(self):
-        values = deepcopy(self.puzzle)
-        for s in self.squares:
-            if len(values[s]) == 1:
+        values = self.puzzle.copy()
+        for i in range(len(self.squares)):
+            if not values[i] & (values[i] - 1):
                 continue
-            for d in random.sample(values[s], len(values[s])):
-                new_values = assign(values.copy(), s, d, self.size, self.units, self.peers)
+            bits = self.candidates(values[i])
+            for bit in random.sample(bits, len(bits)):
+                new_values = assign(values.copy(), i, bit, self.ctx.peers)
                 if new_values:
                     values = new_values
                     break
         return values
 
     def evaluate(self, values):
-        fixed = sum(1 for s in self.squares if len(values[s]) == 1)
+        fixed = sum(1 for v in values if not v & (v - 1))
         if fixed == self.size**2:
             return 1.0
         return fixed / (self.size**2)
 
     def neighbor_search(self, current_solution):
-        new_values = deepcopy(current_solution)
+        new_values = current_solution.copy()
         while True:
-            s = random.choice(self.squares)
-            if s not in self.fixed_cells and len(new_values[s]) > 1:
+            i = random.randrange(len(self.squares))
+            if i not in self.fixed_cells and new_values[i] & (new_values[i] - 1):
                 break
                 
-        for d in random.sample(new_values[s], len(new_values[s])):
-            candidate = assign(new_values.copy(), s, d, self.size)
+        bits = self.candidates(new_values[i])
+        for bit in random.sample(bits, len(bits)):
+            candidate = assign(new_values.copy(), i, bit, self.ctx.peers)
             if candidate:
                 return candidate
                 
         return new_values
 
     def scout_phase(self):
-        idx = self.trials.index(max(self.trials))
+        idx = int(self.trials.argmax())
         self.population[idx] = self.create_cp_solution()
         self.fitnesses[idx] = self.evaluate(self.population[idx])
         self.trials[idx] = 0
+        return idx
 
     def solve(self):
         for cycle in range(self.max_cycles):
             if self.best_fitness >= 0.999:
-                yield self.best_solution, 1.0
+                yield self.to_dict(self.best_solution), 1.0
                 return
 
             # Employed bees phase
@@ -89,35 +109,34 @@ class HybridABCSolver:
                 if neighbor_fit > self.best_fitness:
                     self.best_solution = neighbor
                     self.best_fitness = neighbor_fit
-                    yield self.best_solution, self.best_fitness
+                    yield self.to_dict(self.best_solution), self.best_fitness
 
             # Onlooker bees phase
-            total_fitness = sum(self.fitnesses)
-            if total_fitness > 0:
-                for i in range(self.employed_bees):
-                    prob = self.fitnesses[i] / total_fitness
-                    for _ in range(int(prob * self.onlooker_bees)):
-                        neighbor = self.neighbor_search(self.population[i])
-                        neighbor_fit = self.evaluate(neighbor)
-                        
-                        if neighbor_fit > self.fitnesses[i]:
-                            self.population[i] = neighbor
-                            self.fitnesses[i] = neighbor_fit
-                            self.trials[i] = 0
+            # Share all onlookers out in proportion to fitness with a single draw
+            probs = np.asarray(self.fitnesses)
+            counts = np.random.multinomial(self.onlooker_bees, probs / probs.sum())
+            for i, k in enumerate(counts):
+                for _ in range(k):
+                    neighbor = self.neighbor_search(self.population[i])
+                    neighbor_fit = self.evaluate(neighbor)
+                    
+                    if neighbor_fit > self.fitnesses[i]:
+                        self.population[i] = neighbor
+                        self.fitnesses[i] = neighbor_fit
+                        self.trials[i] = 0
                             
-                        if neighbor_fit > self.best_fitness:
-                            self.best_solution = neighbor
-                            self.best_fitness = neighbor_fit
-                            yield self.best_solution, self.best_fitness
+                    if neighbor_fit > self.best_fitness:
+                        self.best_solution = neighbor
+                        self.best_fitness = neighbor_fit
+                        yield self.to_dict(self.best_solution), self.best_fitness
 
             # Scout bees phase
-            if max(self.trials) > self.scout_limit:
-                self.scout_phase()
-                new_fit = self.fitnesses[self.trials.index(0)]
+            if self.trials.max() > self.scout_limit:
+                idx = self.scout_phase()
+                new_fit = self.fitnesses[idx]
                 if new_fit > self.best_fitness:
-                    self.best_solution = self.population[self.trials.index(0)]
+                    self.best_solution = self.population[idx]
                     self.best_fitness = new_fit
-                    yield self.best_solution, self.best_fitness
+                    yield self.to_dict(self.best_solution), self.best_fitness
 
-            self.best_solution_yield = {k: v[0] for k, v in self.best_solution.items()}
-            yield self.best_solution_yield, self.best_fitness
\ No newline at end of file
+            yield self.to_dict(self.best_solution), self.best_fitness
\ No newline at end of file
@@ -1,41 +1,89 @@
 import numpy as np
 import random
-from abc_solver import ABCSolver
+import multiprocessing
+from abc_solver import ABCSolver, seed_kernels
+
+def _seed_worker():
+    """Give each worker process its own random streams instead of the forked parent's."""
+    seed = random.SystemRandom().randrange(2**32)
+    random.seed(seed)
+    np.random.seed(seed)
+    seed_kernels(seed)
+
+def _run_swarm(conn, puzzle_input, size, population_size):
+    """Keep one sub-swarm resident in a worker process. Each message is a number of ABC
+    cycles to run and is answered with the swarm's (best_solution, best_fitness); None ends it."""
+    _seed_worker()
+    swarm = ABCSolver(puzzle_input, size, population_size)
+    while True:
+        cycles = conn.recv()
+        if cycles is None:
+            break
+        for _ in range(cycles):
+            best = swarm.step()
+        conn.send(best)
+    conn.close()
 
 class MSABCSolver:
     """Multi-Swarm ABC Solver for Sudoku."""
-    def __init__(self, puzzle_input, size, population_size, num_swarms, rcloud, max_cycles=10000):
+    def __init__(self, puzzle_input, size, population_size, num_swarms, rcloud, max_cycles=10000,
+                 cycles_per_round=1):
+        self.puzzle_input = puzzle_input
         self.size = size
         self.population_size = population_size
         self.num_swarms = num_swarms
         self.max_cycles = max_cycles
+        self.cycles_per_round = cycles_per_round
         self.rcloud = rcloud
-        self.swarms = [ABCSolver(puzzle_input, self.size, self.population_size) for _ in range(num_swarms)]
         self.global_best = None
         self.global_fitness = -np.inf
 
     def solve(self):
         """Run the multi-swarm optimization."""
-        for cycle in range(self.max_cycles):
-            # --- Phase 1: Parallel Sub-swarm Optimization ---
-            for swarm in self.subswarms:
-                swarm.abc.solve()  # Run one ABC iteration
-                swarm.update_best()
-
-                # Update global best
-                if swarm.best_fitness > self.global_fitness:
-                    self.global_best = swarm.best_solution.copy()
-                    self.global_fitness = swarm.best_fitness
+        # Each swarm lives in its own process for the whole run; only its best solution 
+        # and fitness cross the process boundary, once per round of cycles
+        workers = []
+        for _ in range(self.num_swarms):
+            conn, child_conn = multiprocessing.Pipe()
+            proc = multiprocessing.Process(target=_run_swarm, daemon=True,
+                                           args=(child_conn, self.puzzle_input, self.size,
+                                                 self.population_size))
+            proc.start()
+            child_conn.close()
+            workers.append((proc, conn))
+        
+        try:
+            cycle = 0
+            while cycle < self.max_cycles:
+                # --- Phase 1: Parallel Sub-swarm Optimization ---
+                rounds = min(self.cycles_per_round, self.max_cycles - cycle)
+                for _, conn in workers:
+                    conn.send(rounds)
+                
+                for _, conn in workers:
+                    # Update global best
+                    best_solution, best_fitness = conn.recv()
+                    if best_fitness > self.global_fitness:
+                        self.global_best = best_solution
+                        self.global_fitness = best_fitness
+                cycle += rounds
 
-            yield self.global_best, self.global_fitness
+                yield self.global_best, self.global_fitness
 
-            # Early termination
-            if self.global_fitness == 1.0:
-                break
+                # Early termination
+                if self.global_fitness == 1.0:
+                    break
+        finally:
+            for proc, conn in workers:
+                if proc.is_alive():
+                    conn.send(None)
+                conn.close()
+            for proc, _ in workers:
+                proc.join()
 
     def get_solution(self):
         """Return the solved Sudoku as a dictionary."""
         if self.global_best is None:
             return None
         return {f"{chr(65 + r)}{c + 1}": str(self.global_best[r, c]) 
-                for r in range(self.size) for c in range(self.size)}
\ No newline at end of file
+                for r in range(self.size) for c in range(self.size)}
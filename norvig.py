@@ -1,101 +1,298 @@
 import re
-from typing import Dict, Optional
+import numpy as np
+from collections import deque
+from typing import List, Optional
+
+try:
+    from numba import njit, prange
+    HAVE_NUMBA = True
+except ImportError:  # numba is optional; solve_puzzles then uses the interpreted search
+    HAVE_NUMBA = False
+    def njit(*args, **kwargs):
+        return lambda func: func
+    prange = range
 
 def cross(A, B) -> tuple:
     "Cross product of strings in A and strings in B."
     return tuple(a + b for a in A for b in B)
 
-Digit     = str  # e.g. '1'
+Digit     = int  # e.g. 1
 digits    = '123456789'
-DigitSet  = str  # e.g. '123'
+DigitSet  = int  # bitmask where bit k means digit k+1 is possible, e.g. 0b111 for '123'
 rows      = 'ABCDEFGHI'
 cols      = digits
-Square    = str  # e.g. 'A9'
+Square    = int  # index into squares, e.g. 8 for 'A9'
 squares   = cross(rows, cols)
-Grid      = Dict[Square, DigitSet] # E.g. {'A9': '123', ...}
+Grid      = List[DigitSet] # E.g. [0b111111111, ...], indexed by Square
 all_boxes = [cross(rs, cs)  for rs in ('ABC','DEF','GHI') for cs in ('123','456','789')]
 all_units = [cross(rows, c) for c in cols] + [cross(r, cols) for r in rows] + all_boxes
 units     = {s: tuple(u for u in all_units if s in u) for s in squares}
 peers     = {s: set().union(*units[s]) - {s} for s in squares}
 Picture   = str 
 
+# The same structures keyed by Square index, as used by the bitmask Grid: flat int32 tables
+# for vectorized and compiled code, plus tuple views of them for the interpreted hot loops.
+all_digits     = (1 << len(digits)) - 1
+sq_index       = {s: i for i, s in enumerate(squares)}
+all_units_arr  = np.array([[sq_index[s] for s in u] for u in all_units], dtype=np.int32)      # [27, 9]
+units_arr      = np.array([[[sq_index[s2] for s2 in u] for u in units[s]] for s in squares], 
+                          dtype=np.int32)                                                     # [81, 3, 9]
+peers_arr      = np.array([[sq_index[s2] for s2 in sorted(peers[s])] for s in squares], 
+                          dtype=np.int32)                                                     # [81, 20]
+unit_idx       = [tuple(map(tuple, u)) for u in units_arr.tolist()]
+peer_idx       = [tuple(p) for p in peers_arr.tolist()]
+popcount    = [bin(m).count('1') for m in range(all_digits + 1)]
+mask_digits = [tuple(d for d in range(1, 10) if m >> (d - 1) & 1) for m in range(all_digits + 1)]
+
+def digit_set(chars: str) -> DigitSet:
+    "The DigitSet holding each of the digit characters in chars."
+    return sum(1 << (int(c) - 1) for c in set(chars))
+
 def is_solution(solution: Grid, puzzle: Grid) -> bool:
     "Is this proposed solution to the puzzle actually valid?"
-    return (solution is not None and
-            all(solution[s] in puzzle[s] for s in squares) and
-            all({solution[s] for s in unit} == set(digits) for unit in all_units))
+    if solution is None:
+        return False
+    solution, puzzle = np.array(solution), np.array(puzzle)
+    return (all(popcount[bits] == 1 for bits in solution.tolist()) and
+            bool(np.all(solution & puzzle)) and
+            bool(np.all(np.bitwise_or.reduce(solution[all_units_arr], axis=1) == all_digits)))
 
 def constrain(grid) -> Grid:
     "Propagate constraints on a copy of grid to yield a new constrained Grid."
-    result: Grid = {s: digits for s in squares}
-    for s in grid:
-        if len(grid[s]) == 1:
-            fill(result, s,  grid[s])
+    result: Grid = [all_digits] * len(squares)
+    for s, bits in enumerate(grid):
+        if popcount[bits] == 1:
+            fill(result, s, bits.bit_length())
     return result
 
-def fill(grid: Grid, s: Square, d: Digit) -> Optional[Grid]:
+FILL, ELIMINATE = True, False # The two kinds of task on the propagation queue
+
+Trail     = List[tuple] # (square, digit bit) for every elimination, so it can be undone
+
+def fill(grid: Grid, s: Square, d: Digit, trail: Trail = None) -> Optional[Grid]:
     """Eliminate all the digits except d from grid[s]."""
-    if grid[s] == d or all(eliminate(grid, s, d2) for d2 in grid[s] if d2 != d):
-        return grid
-    else:
-        return None
+    return propagate(grid, deque([(FILL, s, 1 << (d - 1))]), [] if trail is None else trail)
 
-def eliminate(grid: Grid, s: Square, d: Digit) -> Optional[Grid]:
+def eliminate(grid: Grid, s: Square, d: Digit, trail: Trail = None) -> Optional[Grid]:
     """Eliminate d from grid[s]; implement the two constraint propagation strategies."""
-    if d not in grid[s]:
-        return grid        ## Already eliminated
-    grid[s] = grid[s].replace(d, '')
-    if not grid[s]:
-        return None        ## None: no legal digit left
-    elif len(grid[s]) == 1:
-        # 1. If a square has only one possible digit, then eliminate that digit as a possibility for each of the square's peers.
-        d2 = grid[s]
-        if not all(eliminate(grid, s2, d2) for s2 in peers[s]):
-            return None    ## None: can't eliminate d2 from some square
-    for u in units[s]:
-        dplaces = [s for s in u if d in grid[s]]
-        # 2. If a unit has only one possible square that can hold a digit, then fill the square with the digit.
-        if not dplaces or (len(dplaces) == 1 and not fill(grid, dplaces[0], d)):
-            return None    ## None: no place in u for d
+    return propagate(grid, deque([(ELIMINATE, s, 1 << (d - 1))]), [] if trail is None else trail)
+
+def undo(grid: Grid, trail: Trail, mark: int) -> Grid:
+    """Put back every elimination recorded on the trail since mark."""
+    for s, m in reversed(trail[mark:]):
+        grid[s] |= m
+    del trail[mark:]
     return grid
 
+def propagate(grid: Grid, todo: deque, trail: Trail) -> Optional[Grid]:
+    """Work through a queue of (FILL or ELIMINATE, square, digit bit) tasks, queueing the tasks they imply."""
+    while todo:
+        task, s, m = todo.popleft()
+        if task is FILL:
+            if not grid[s] & m:
+                return None    ## None: the digit is no longer possible in s
+            others = grid[s] ^ m
+            while others:
+                m2 = others & -others
+                todo.append((ELIMINATE, s, m2))
+                others ^= m2
+            continue
+        if not grid[s] & m:
+            continue           ## Already eliminated
+        grid[s] ^= m
+        trail.append((s, m))
+        if not grid[s]:
+            return None        ## None: no legal digit left
+        elif not grid[s] & (grid[s] - 1):
+            # 1. If a square has only one possible digit, then eliminate that digit as a possibility for each of the square's peers.
+            m2 = grid[s]
+            todo.extend((ELIMINATE, s2, m2) for s2 in peer_idx[s] if grid[s2] & m2)
+        for u in unit_idx[s]:
+            dplaces = [s for s in u if grid[s] & m]
+            # 2. If a unit has only one possible square that can hold a digit, then fill the square with the digit.
+            if not dplaces:
+                return None    ## None: no place in u for the digit
+            elif len(dplaces) == 1:
+                todo.append((FILL, dplaces[0], m))
+    return grid
+
+picture_token = re.compile(r"[.1-9]|[{][1-9]+[}]")
+char_bits     = {'.': all_digits, **{d: 1 << i for i, d in enumerate(digits)}}
+
 def parse(picture) -> Grid:
     """Convert a Picture to a Grid."""
-    vals = re.findall(r"[.1-9]|[{][1-9]+[}]", picture)
-    assert len(vals) == 81
-    return {s: digits if v == '.' else re.sub(r"[{}]", '', v) 
-            for s, v in zip(squares, vals)}
+    if '{' in picture:
+        grid = [char_bits[v] if len(v) == 1 else digit_set(v[1:-1]) for v in picture_token.findall(picture)]
+    else: # Common case: one character per square, so a table lookup replaces the regex
+        grid = [char_bits[c] for c in picture if c in char_bits]
+    assert len(grid) == 81
+    return grid
 
 def picture(grid) -> Picture:
     """Convert a Grid to a Picture string, one line at a time."""
     if grid is None: 
         return "None"
-    def val(d: DigitSet) -> str: return '.' if d == digits else d if len(d) == 1 else '{' + d + '}'
-    maxwidth = max(len(val(grid[s])) for s in grid)
+    def val(bits: DigitSet) -> str:
+        d = ''.join(map(str, mask_digits[bits]))
+        return '.' if bits == all_digits else d if len(d) == 1 else '{' + d + '}'
+    maxwidth = max(len(val(bits)) for bits in grid)
     dash1 = '-' * (maxwidth * 3 + 2)
     dash3 = '\n' + '+'.join(3 * [dash1])
-    def cell(r, c): return val(grid[r + c]).center(maxwidth) + ('|'  if c in '36' else ' ')
+    def cell(r, c): return val(grid[sq_index[r + c]]).center(maxwidth) + ('|'  if c in '36' else ' ')
     def line(r): return ''.join(cell(r, c) for c in cols)    + (dash3 if r in 'CF' else '')
     return '\n'.join(map(line, rows))
 
-def search(grid) -> Grid:
-    "Depth-first search with constraint propagation to find a solution."
+def least_constraining(grid: Grid, s: Square) -> List[Digit]:
+    """The digits still possible in grid[s], ordered so the one leaving the most candidates 
+    in the peers of s comes first; that is the digit fewest peers still hold."""
+    peer_bits = [grid[p] for p in peer_idx[s]]
+    return sorted(mask_digits[grid[s]], 
+                  key=lambda d: sum(1 for bits in peer_bits if bits >> (d - 1) & 1))
+
+def search(grid, trail: Trail = None) -> Grid:
+    """Depth-first search with constraint propagation to find a solution.
+    Branches are tried in place on grid and rolled back from the trail, rather than on copies."""
     if grid is None: 
         return None
-    s = min((s for s in squares if len(grid[s]) > 1), 
-            default=None, key=lambda s: len(grid[s]))
+    if trail is None:
+        trail = []
+    s = min((s for s in range(len(squares)) if popcount[grid[s]] > 1), 
+            default=None, key=lambda s: popcount[grid[s]])
     if s is None: # No squares with multiple possibilities; the search has succeeded
         return grid
-    for d in grid[s]:
-        solution = search(fill(grid.copy(), s, d))
-        if solution:
-            return solution
+    for d in least_constraining(grid, s):
+        mark = len(trail)
+        if fill(grid, s, d, trail) is not None and search(grid, trail) is not None:
+            return grid
+        undo(grid, trail, mark)
     return None
 
+# The compiled solver: the same fill/eliminate propagation, MRV choice and least-constraining 
+# order as search, over a uint16[81] grid with explicit stacks in place of recursion and deques.
+# Along one path every (square, digit) is eliminated at most once, which bounds the trail, and 
+# each elimination queues at most 20 peer eliminations plus 3 fills of up to 8 eliminations each.
+TRAIL_SIZE = 81 * 9
+TODO_SIZE  = 9 + TRAIL_SIZE * 47
+popcount_arr = np.array(popcount, dtype=np.uint8)
+
+@njit(cache=True)
+def _propagate(g, s, m, todo_fill, todo_sq, todo_bit, trail_sq, trail_bit, top):
+    """Fill digit bit m into g[s], propagating as `propagate` does. Returns (ok, new trail top)."""
+    todo_fill[0], todo_sq[0], todo_bit[0] = True, s, m
+    n = 1
+    while n:
+        n -= 1
+        s, m = todo_sq[n], todo_bit[n]
+        bits = int(g[s])
+        if todo_fill[n]:
+            if not bits & m:
+                return False, top
+            others = bits ^ m
+            while others:
+                m2 = others & -others
+                todo_fill[n], todo_sq[n], todo_bit[n] = False, s, m2
+                n += 1
+                others ^= m2
+            continue
+        if not bits & m:
+            continue
+        bits ^= m
+        g[s] = bits
+        trail_sq[top], trail_bit[top] = s, m
+        top += 1
+        if not bits:
+            return False, top
+        if not bits & (bits - 1):
+            for s2 in peers_arr[s]:
+                if g[s2] & bits:
+                    todo_fill[n], todo_sq[n], todo_bit[n] = False, s2, bits
+                    n += 1
+        for u in range(3):
+            count, place = 0, -1
+            for s2 in units_arr[s, u]:
+                if g[s2] & m:
+                    count += 1
+                    place = s2
+            if count == 0:
+                return False, top
+            if count == 1:
+                todo_fill[n], todo_sq[n], todo_bit[n] = True, place, m
+                n += 1
+    return True, top
+
+@njit(cache=True)
+def solve_one(puzzle):
+    """Solve a uint16[81] bitmask grid; the solution, or all zeros if there is none."""
+    g = np.full(81, all_digits, dtype=np.uint16)
+    todo_fill = np.empty(TODO_SIZE, dtype=np.bool_)
+    todo_sq   = np.empty(TODO_SIZE, dtype=np.int32)
+    todo_bit  = np.empty(TODO_SIZE, dtype=np.int32)
+    trail_sq  = np.empty(TRAIL_SIZE, dtype=np.int16)
+    trail_bit = np.empty(TRAIL_SIZE, dtype=np.uint16)
+    top = 0
+    for s in range(81):
+        if popcount_arr[puzzle[s]] == 1:
+            ok, top = _propagate(g, s, int(puzzle[s]), todo_fill, todo_sq, todo_bit, trail_sq, trail_bit, top)
+            if not ok:
+                return np.zeros(81, dtype=np.uint16)
+    # One frame per decision: the square, the digits not yet tried, the peer count of each 
+    # digit (for the least-constraining order) and the trail top to roll back to.
+    frame_sq    = np.empty(81, dtype=np.int32)
+    frame_left  = np.empty(81, dtype=np.int32)
+    frame_count = np.empty((81, 9), dtype=np.int32)
+    frame_mark  = np.empty(81, dtype=np.int32)
+    depth = 0
+    while True:
+        s, best = -1, 10
+        for s2 in range(81):
+            k = popcount_arr[g[s2]]
+            if 1 < k < best:
+                s, best = s2, k
+        if s < 0:  # No squares with multiple possibilities; the search has succeeded
+            return g
+        frame_sq[depth], frame_left[depth], frame_mark[depth] = s, g[s], top
+        for d in range(9):
+            frame_count[depth, d] = 0
+        for s2 in peers_arr[s]:
+            for d in range(9):
+                if g[s2] >> d & 1:
+                    frame_count[depth, d] += 1
+        depth += 1
+        while True:
+            if depth == 0:
+                return np.zeros(81, dtype=np.uint16)
+            f = depth - 1
+            while top > frame_mark[f]:
+                top -= 1
+                g[trail_sq[top]] |= trail_bit[top]
+            left = frame_left[f]
+            if not left:
+                depth -= 1
+                continue
+            d = -1
+            for d2 in range(9):
+                if left >> d2 & 1 and (d < 0 or frame_count[f, d2] < frame_count[f, d]):
+                    d = d2
+            frame_left[f] = left ^ (1 << d)
+            ok, top = _propagate(g, frame_sq[f], 1 << d, todo_fill, todo_sq, todo_bit, trail_sq, trail_bit, top)
+            if ok:
+                break
+
+@njit(parallel=True, cache=True)
+def solve_batch(puzzles):
+    """solve_one applied to each row of a uint16[N, 81] array, in parallel."""
+    solutions = np.empty_like(puzzles)
+    for i in prange(puzzles.shape[0]):
+        solutions[i] = solve_one(puzzles[i])
+    return solutions
+
 def solve_puzzles(puzzles, verbose=True) -> int:
     "Solve and verify each puzzle, and if `verbose`, print puzzle and solution."
-    for puzzle in puzzles:
-        solution = search(constrain(puzzle))
+    if HAVE_NUMBA:
+        solutions = solve_batch(np.array(puzzles, dtype=np.uint16)).tolist()
+    else:
+        solutions = [search(constrain(puzzle)) for puzzle in puzzles]
+    for puzzle, solution in zip(puzzles, solutions):
         assert is_solution(solution, puzzle)
         if verbose:
             print_side_by_side('\nPuzzle:\n' + picture(puzzle), 
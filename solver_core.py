@@ -0,0 +1,125 @@
+import numpy as np
+
+try:
+    from numba import njit
+    HAVE_NUMBA = True
+except ImportError:  # numba is optional; njit then leaves functions as plain Python
+    HAVE_NUMBA = False
+    def njit(*args, **kwargs):
+        return lambda func: func
+
+def flatten_peers(peers):
+    """Flat int32 peer indexes and the offsets of each square's run, from a tuple of peer tuples."""
+    peers_off = np.zeros(len(peers) + 1, dtype=np.int32)
+    peers_off[1:] = np.cumsum([len(p) for p in peers])
+    peers_flat = np.array([i2 for p in peers for i2 in p], dtype=np.int32)
+    return peers_flat, peers_off
+
+@njit(cache=True)
+def propagate(values, peers, peers_off, i, bit, trail_sq, trail_old, top, todo_sq, todo_bit):
+    """Fill bit into values[i] and eliminate as sudo.propagate does, recording each changed
+    square and its old mask on the trail. Returns (ok, new trail top)."""
+    n = 0
+    others = values[i] & ~bit
+    while others:
+        bit2 = others & -others
+        todo_sq[n], todo_bit[n] = i, bit2
+        n += 1
+        others ^= bit2
+    while n:
+        n -= 1
+        s, bit2 = todo_sq[n], todo_bit[n]
+        v = values[s]
+        if not v & bit2:
+            continue
+        trail_sq[top], trail_old[top] = s, v
+        top += 1
+        v ^= bit2
+        values[s] = v
+        if v == 0:
+            return False, top
+        if v & (v - 1) == 0:
+            for k in range(peers_off[s], peers_off[s + 1]):
+                if values[peers[k]] & v:
+                    todo_sq[n], todo_bit[n] = peers[k], v
+                    n += 1
+    return True, top
+
+@njit(cache=True)
+def select_square(values, peers, peers_off, counts):
+    """sudo.select_square: fewest candidates, then most unsolved peers, then lowest index; -1 if solved."""
+    best = 0
+    for s in range(values.shape[0]):
+        v = values[s]
+        c = 0
+        while v:
+            v &= v - 1
+            c += 1
+        counts[s] = c
+        if c > 1 and (best == 0 or c < best):
+            best = c
+    if best == 0:
+        return -1
+    i, degree = -1, -1
+    for s in range(values.shape[0]):
+        if counts[s] == best:
+            d = 0
+            for k in range(peers_off[s], peers_off[s + 1]):
+                if counts[peers[k]] > 1:
+                    d += 1
+            if d > degree:
+                i, degree = s, d
+    return i
+
+@njit(cache=True)
+def search(values, peers, peers_off, stop):
+    """Depth-first search over an int32 array of candidate bitmasks, solving it in place.
+    Recursion is replaced by one frame per decision: the square, the digits not yet tried
+    and the trail top to undo to. stop is a one-element int8 array, read at every decision
+    so another process can end the search by setting it. Returns True if values now holds
+    a solution."""
+    n = values.shape[0]
+    all_bits, ndigits, max_peers = 0, 0, 0
+    for s in range(n):
+        all_bits |= values[s]
+        max_peers = max(max_peers, peers_off[s + 1] - peers_off[s])
+    while all_bits >> ndigits:
+        ndigits += 1
+    # Along one path each (square, digit) is eliminated at most once, bounding the trail,
+    # and each elimination queues at most one elimination per peer.
+    trail_size = n * ndigits
+    todo_size = ndigits + trail_size * max_peers
+    trail_sq = np.empty(trail_size, dtype=np.int32)
+    trail_old = np.empty(trail_size, dtype=np.int32)
+    todo_sq = np.empty(todo_size, dtype=np.int32)
+    todo_bit = np.empty(todo_size, dtype=np.int32)
+    counts = np.empty(n, dtype=np.int32)
+    frame_sq = np.empty(n, dtype=np.int32)
+    frame_left = np.empty(n, dtype=np.int32)
+    frame_mark = np.empty(n, dtype=np.int32)
+    depth, top = 0, 0
+    while True:
+        if stop[0]:
+            return False
+        i = select_square(values, peers, peers_off, counts)
+        if i < 0:
+            return True
+        frame_sq[depth], frame_left[depth], frame_mark[depth] = i, values[i], top
+        depth += 1
+        while True:
+            if depth == 0:
+                return False
+            f = depth - 1
+            while top > frame_mark[f]:
+                top -= 1
+                values[trail_sq[top]] = trail_old[top]
+            left = frame_left[f]
+            if not left:
+                depth -= 1
+                continue
+            bit = left & -left
+            frame_left[f] = left ^ bit
+            ok, top = propagate(values, peers, peers_off, frame_sq[f], bit,
+                                trail_sq, trail_old, top, todo_sq, todo_bit)
+            if ok:
+                break
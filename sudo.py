@@ -1,9 +1,20 @@
+import multiprocessing
+from collections import deque, namedtuple
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from functools import lru_cache
+import numpy as np
+import solver_core
+
 def cross(A, B):
     """Cross product of elements in A and elements in B."""
     return [a+b for a in A for b in B]
 
+@lru_cache(maxsize=16)
 def initialize_structures(size):
-    """Initialize all Sudoku structures with proper cell IDs"""
+    """Initialize all Sudoku structures with proper cell IDs.
+    
+    The result is cached per size and shared by every caller, so the containers
+    are immutable (tuples and frozensets) and must not be modified."""
     if size < 1:
         raise ValueError(f"Invalid Sudoku size: {size}")
 
@@ -11,10 +22,10 @@ def initialize_structures(size):
     rows = 'ABCDEFGHIJKLMNOPQRSTUVWXYZ'[:size]
     
     # Generate column labels (1, 2, 3, etc.) - MUST start from 1
-    cols = [str(i+1) for i in range(size)]
+    cols = tuple(str(i+1) for i in range(size))
     
     # Create all valid cell IDs
-    squares = cross(rows, cols)
+    squares = tuple(cross(rows, cols))
     
     # Calculate subgrid dimensions
     subgrid_rows = int(size**0.5)
@@ -26,17 +37,18 @@ def initialize_structures(size):
     digits = [str(i+1) for i in range(min(size, 9))]
     if size > 9:
         digits += [chr(ord('A') + i) for i in range(size - 9)]
+    digits = tuple(digits)
     
     # Build unitlist - FIXED implementation
     unitlist = []
     
     # Columns (A1-L1, A2-L2, etc.)
     for c in cols:
-        unitlist.append([f"{r}{c}" for r in rows])
+        unitlist.append(tuple(f"{r}{c}" for r in rows))
     
     # Rows (A1-A12, B1-B12, etc.)
     for r in rows:
-        unitlist.append([f"{r}{c}" for c in cols])
+        unitlist.append(tuple(f"{r}{c}" for c in cols))
     
     # Subgrids - fixed to handle multi-digit columns
     for i in range(0, size, subgrid_rows):
@@ -47,13 +59,53 @@ def initialize_structures(size):
                     row = rows[i+x]
                     col = cols[j+y]
                     subgrid.append(f"{row}{col}")
-            unitlist.append(subgrid)
+            unitlist.append(tuple(subgrid))
+    unitlist = tuple(unitlist)
     
-    units = {s: [u for u in unitlist if s in u] for s in squares}
-    peers = {s: set().union(*units[s]) - {s} for s in squares}
+    units = {s: tuple(u for u in unitlist if s in u) for s in squares}
+    peers = {}
+    for s in squares:
+        p = set()
+        for u in units[s]:
+            p.update(u)
+        p.discard(s)
+        peers[s] = frozenset(p)
     
     return rows, cols, squares, unitlist, units, peers, subgrid_rows, subgrid_cols, digits
 
+# The structures the solver needs, looked up once per puzzle and passed down the search.
+# Squares are int indexes into ctx.squares, so values is a list and peers[i] a tuple of 
+# indexes; cell IDs are only used to read the grid in and write the solution out.
+# Candidate digits are kept as int bitmasks: bit i set means digits[i] is still possible.
+# popcount[mask] is the number of candidates in a mask; it is a table for up to 16 digits
+# and None beyond that, where int.bit_count is used instead.
+Ctx = namedtuple('Ctx', ['size', 'squares', 'sq_index', 'peers', 'digits', 'digit_to_bit', 'bit_to_digit',
+                         'popcount', 'peers_flat', 'peers_off'])
+
+@lru_cache(maxsize=16)
+def solver_context(size):
+    """The Ctx for a size, built from initialize_structures and cached the same way."""
+    _, _, squares, _, _, peers, _, _, digits = initialize_structures(size)
+    sq_index = {s: i for i, s in enumerate(squares)}
+    peer_idx = tuple(tuple(sorted(sq_index[p] for p in peers[s])) for s in squares)
+    digit_to_bit = {d: 1 << i for i, d in enumerate(digits)}
+    bit_to_digit = {bit: d for d, bit in digit_to_bit.items()}
+    popcount = [bin(m).count('1') for m in range(1 << len(digits))] if len(digits) <= 16 else None
+    peers_flat, peers_off = solver_core.flatten_peers(peer_idx)
+    return Ctx(size, squares, sq_index, peer_idx, digits, digit_to_bit, bit_to_digit, popcount,
+               peers_flat, peers_off)
+
+# Build the grid sizes the app offers up front, so no solve or render pays for them
+list(map(solver_context, (6, 9, 12)))
+
+class _PuzzleCharTable(dict):
+    """str.translate table that keeps puzzle characters and deletes any other character"""
+    def __missing__(self, code):
+        self[code] = None
+        return None
+
+_PUZZLE_CHARS = _PuzzleCharTable((ord(c), c) for c in '0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZ.')
+
 def grid_values(grid, size):
     """Convert grid into a dict of {square: char} with proper size handling"""
     rows, cols, squares, *_ = initialize_structures(size)
@@ -73,104 +125,220 @@ def grid_values(grid, size):
             lines = lines[1:]  # Skip the size line
         
         # Combine all puzzle lines and filter out non-puzzle characters
-        puzzle_chars = []
-        for line in lines:
-            for c in line:
-                if c in '0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZ.':
-                    puzzle_chars.append(c)
+        puzzle_chars = ''.join(lines).translate(_PUZZLE_CHARS)
         
         if len(puzzle_chars) != size * size:
             raise ValueError(f"Expected {size*size} cells, got {len(puzzle_chars)}")
         
         # Create dictionary with proper cell IDs
-        grid_dict = {}
-        index = 0
-        for row in rows:
-            for col in cols:
-                cell_id = f"{row}{col}"
-                val = puzzle_chars[index]
-                grid_dict[cell_id] = val if val != '0' else '.'
-                index += 1
-        return grid_dict
+        return {s: (c if c != '0' else '.') for s, c in zip(squares, puzzle_chars)}
     
     raise ValueError("Unsupported grid format")
 
-def parse_grid(grid, size):
-    """Convert grid to a dict of possible values with proper units"""
-    rows, cols, squares, unitlist, units, peers, _, _, digits = initialize_structures(size)
-    values = {s: digits.copy() for s in squares}
+def parse_grid(grid, ctx):
+    """Convert grid to a list of possible values, indexed like ctx.squares"""
+    values = [(1 << len(ctx.digits)) - 1] * len(ctx.squares)
     
-    grid_dict = grid_values(grid, size)
+    grid_dict = grid_values(grid, ctx.size)
     
     for s, d in grid_dict.items():
-        if d != '.' and d in digits:
-            if not assign(values, s, d, peers):
+        if d != '.' and d in ctx.digits:
+            if not assign(values, ctx.sq_index[s], ctx.digit_to_bit[d], ctx.peers):
                 return False
     return values
 
-def assign(values, s, d, peers):
-    """Eliminate all other values except d from values[s]"""
-    other_values = [v for v in values[s] if v != d]
-    for d2 in other_values:
-        if not eliminate(values, s, d2, peers):
+def assign(values, i, bit, peers, trail=None):
+    """Eliminate all other values except bit from values[i]"""
+    other_bits = values[i] & ~bit
+    pairs = []
+    while other_bits:
+        bit2 = other_bits & -other_bits
+        pairs.append((i, bit2))
+        other_bits ^= bit2
+    return propagate(values, pairs, peers, [] if trail is None else trail)
+
+def eliminate(values, i, bit, peers, trail):
+    """Eliminate bit from values[i], recording the old value on the trail;
+    return the (square, bit) eliminations this implies, or False"""
+    if not values[i] & bit:
+        return ()
+    
+    trail.append((i, values[i]))
+    values[i] ^= bit
+    
+    if values[i] == 0:
+        return False
+    elif values[i] & (values[i] - 1) == 0:
+        bit2 = values[i]
+        return [(i2, bit2) for i2 in peers[i] if values[i2] & bit2]
+    return ()
+
+def propagate(values, pairs, peers, trail):
+    """Eliminate each (square, bit) pair, and every pair that implies in turn, from a work queue"""
+    todo = deque(pairs)
+    while todo:
+        i, bit = todo.popleft()
+        implied = eliminate(values, i, bit, peers, trail)
+        if implied is False:
             return False
+        todo.extend(implied)
     return values
 
-def eliminate(values, s, d, peers):
-    """Eliminate d from values[s]"""
-    if d not in values[s]:
-        return values
+def undo(values, trail, mark):
+    """Restore the values recorded on the trail since mark, newest first, and drop them"""
+    for i, old in reversed(trail[mark:]):
+        values[i] = old
+    del trail[mark:]
+
+_NO_STOP = np.zeros(1, dtype=np.int8)  # The stop flag of a sequential solve, never set
+
+def solve(grid, size, learn=False):
+    """Solve a Sudoku puzzle and return dict of single values.
+    With learn=True the search learns conflict levels from dead ends and backjumps over them."""
+    ctx = solver_context(size)
+    values = parse_grid(grid, ctx)
+    if not values:
+        return False
     
-    values[s].remove(d)
+    if learn:
+        solution, _ = search_backjump(values, ctx, [], [0] * len(values), 0)
+    elif solver_core.HAVE_NUMBA:
+        cells = np.array(values, dtype=np.int32)
+        solution = solver_core.search(cells, ctx.peers_flat, ctx.peers_off, _NO_STOP) and cells.tolist()
+    else:
+        solution = search(values, ctx)
+    if not solution:
+        return False
     
-    if len(values[s]) == 0:
+    # Convert the single-bit masks back to digits
+    return {s: ctx.bit_to_digit[bits] for s, bits in zip(ctx.squares, solution)}
+
+_stop_flag = None  # Set in each solve_parallel worker; a solution found anywhere sets it to 1
+
+def _init_search_worker(stop):
+    """Give a worker process the flag shared by every branch of a parallel solve, as an
+    int8 array so both searches can read it."""
+    global _stop_flag
+    _stop_flag = np.frombuffer(stop, dtype=np.int8)
+
+def _search_branch(values, i, bit, size):
+    """Search the branch with bit filled into square i, in a worker process."""
+    ctx = solver_context(size)
+    if not assign(values, i, bit, ctx.peers):
         return False
-    elif len(values[s]) == 1:
-        d2 = values[s][0]
-        for s2 in peers[s]:
-            if not eliminate(values, s2, d2, peers):
-                return False
-    return values
+    if solver_core.HAVE_NUMBA:
+        cells = np.array(values, dtype=np.int32)
+        found = solver_core.search(cells, ctx.peers_flat, ctx.peers_off, _stop_flag)
+        solution = found and cells.tolist()
+    else:
+        solution = search(values, ctx, stop=_stop_flag)
+    if solution:
+        _stop_flag[0] = 1
+    return solution
 
-def solve(grid, size):
-    """Solve a Sudoku puzzle and return dict of single values"""
-    values = parse_grid(grid, size)
+def solve_parallel(grid, size, workers=4):
+    """Solve like solve, but search the branches of the first MRV square in worker processes;
+    the first solution found stops the others"""
+    ctx = solver_context(size)
+    values = parse_grid(grid, ctx)
     if not values:
         return False
     
-    solution = search(values, size)
+    i = select_square(values, ctx)
+    solution = values if i < 0 else False
+    if i >= 0:
+        bits, branches = values[i], []
+        while bits:
+            branches.append(bits & -bits)
+            bits ^= branches[-1]
+        stop = multiprocessing.RawArray('b', 1)
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_search_worker, 
+                                 initargs=(stop,)) as pool:
+            futures = [pool.submit(_search_branch, values, i, bit, size) for bit in branches]
+            for future in as_completed(futures):
+                solution = future.result()
+                if solution:
+                    stop[0] = 1
+                    for f in futures:
+                        f.cancel()
+                    break
     if not solution:
         return False
     
-    # Convert to single values
-    solved_dict = {}
-    for s in solution:
-        val = solution[s]
-        if isinstance(val, list):
-            if len(val) == 1:
-                solved_dict[s] = val[0]
-            else:
-                return False  # Invalid solution
-        else:
-            solved_dict[s] = val
-    
-    return solved_dict
-
-def search(values, size):
-    """Depth-first search"""
+    return {s: ctx.bit_to_digit[bits] for s, bits in zip(ctx.squares, solution)}
+
+def select_square(values, ctx):
+    """Minimum remaining values: an unsolved square with the fewest candidates, or -1 if all 
+    are solved. Ties go to the square with the most unsolved peers (dynamic degree), which 
+    constrains the most of the rest of the grid, and then to the lowest index."""
+    counts = list(map(ctx.popcount.__getitem__ if ctx.popcount else int.bit_count, values))
+    best = min((n for n in counts if n > 1), default=0)
+    if not best:
+        return -1
+    ties = [i for i, n in enumerate(counts) if n == best]
+    if len(ties) == 1:
+        return ties[0]
+    return max(ties, key=lambda i: sum(1 for i2 in ctx.peers[i] if counts[i2] > 1))
+
+def search(values, ctx, trail=None, stop=None):
+    """Depth-first search, trying each branch in place on values and undoing it from the trail.
+    If a stop flag array is given, the search gives up once stop[0] is set."""
     if values is False:
         return False
+    if stop is not None and stop[0]:
+        return False
+    if trail is None:
+        trail = []
     
-    _, _, squares, _, _, peers, _, _, _ = initialize_structures(size)
+    i = select_square(values, ctx)
+    if i < 0:
+        return values
     
-    if all(len(values[s]) == 1 for s in squares):
-        return {s: values[s][0] for s in squares}  # Convert to single values
+    bits = values[i]
+    while bits:
+        bit = bits & -bits
+        mark = len(trail)
+        if assign(values, i, bit, ctx.peers, trail) and search(values, ctx, trail, stop):
+            return values
+        undo(values, trail, mark)
+        bits ^= bit
+    return False
+
+def search_backjump(values, ctx, trail, levels, depth):
+    """Depth-first search with conflict-directed backjumping, for a path of `depth` decisions.
     
-    n, s = min((len(values[s]), s) for s in squares if len(values[s]) > 1)
+    levels[i] is the depth of the decision that last changed square i (0 for the puzzle 
+    itself). A decision that fails in propagation only read squares as they stood after the 
+    decisions up to the highest level among the squares it changed, so that prefix of the 
+    path plus the decision is a nogood. When every digit of a square fails, the prefix up to 
+    the highest of those levels, and of the square's own level, is a nogood for the node. 
+    If that prefix leaves out the parent's decision, the parent's other digits would fail 
+    the same way, so the search jumps back past them. Returns (solution, None), or 
+    (False, m) when the first m decisions of the path cannot be completed."""
+    i = select_square(values, ctx)
+    if i < 0:
+        return values, None
     
-    for d in values[s]:
-        new_values = {k: v.copy() for k, v in values.items()}
-        result = search(assign(new_values, s, d, peers), size)
-        if result:
-            return result
-    return False
\ No newline at end of file
+    conflict = levels[i]
+    bits = values[i]
+    while bits:
+        bit = bits & -bits
+        bits ^= bit
+        mark = len(trail)
+        if not assign(values, i, bit, ctx.peers, trail):
+            conflict = max(conflict, max(levels[i2] for i2, _ in trail[mark:]))
+            undo(values, trail, mark)
+            continue
+        changed = [(i2, levels[i2]) for i2, _ in trail[mark:]]
+        for i2, _ in changed:
+            levels[i2] = depth + 1
+        solution, m = search_backjump(values, ctx, trail, levels, depth + 1)
+        if solution:
+            return solution, None
+        for i2, level in reversed(changed):
+            levels[i2] = level
+        undo(values, trail, mark)
+        if m <= depth:  # The failure below did not depend on this digit: backjump
+            return False, m
+        conflict = depth
+    return False, conflict
@@ -2,6 +2,7 @@
 import streamlit as st
 import time
 import numpy as np
+from functools import lru_cache
 from sudo import solve as norvig_solve, grid_values, initialize_structures
 from abc_solver import ABCSolver
 from hybrid_abc_cp import HybridABCSolver
@@ -53,37 +54,61 @@ st.markdown("""
 </style>
 """, unsafe_allow_html=True)
 
-def is_incorrect(grid, row, col, value, size, subgrid_rows, subgrid_cols):
-    """Check if a value violates Sudoku rules in the current grid"""
-    if value == 0:
-        return False
+def compute_error_mask(grid, subgrid_rows, subgrid_cols):
+    """Boolean mask of the filled cells whose value repeats in their row, column or subgrid"""
+    size = grid.shape[0]
+    onehot = grid[:, :, None] == np.arange(1, size + 1)  # [row, col, value]
+    dup = onehot & (onehot.sum(axis=1, keepdims=True) > 1)
+    dup |= onehot & (onehot.sum(axis=0, keepdims=True) > 1)
     
-    # Check row
-    if np.sum(grid[row, :] == value) > 1:
-        return True
-    
-    # Check column
-    if np.sum(grid[:, col] == value) > 1:
-        return True
-    
-    # Check subgrid
-    box_row = (row // subgrid_rows) * subgrid_rows
-    box_col = (col // subgrid_cols) * subgrid_cols
-    box = grid[box_row:box_row+subgrid_rows, box_col:box_col+subgrid_cols]
-    if np.sum(box == value) > 1:
-        return True
-    
-    return False
+    # Subgrids: split rows and cols into (block, offset) axes and count over the offsets
+    blocks = onehot.reshape(size // subgrid_rows, subgrid_rows, size // subgrid_cols, subgrid_cols, size)
+    box_dup = blocks & (blocks.sum(axis=(1, 3), keepdims=True) > 1)
+    dup |= box_dup.reshape(size, size, size)
+    return dup.any(axis=2)
+
+@lru_cache(maxsize=None)
+def _cell_templates(size, subgrid_rows, subgrid_cols):
+    """Thick-border classes of every cell for one grid shape, as [row][col] suffix strings"""
+    return tuple(
+        tuple((" border-right-thick" if (j+1) % subgrid_cols == 0 and j != size-1 else "") +
+              (" border-bottom-thick" if (i+1) % subgrid_rows == 0 and i != size-1 else "")
+              for j in range(size))
+        for i in range(size))
+
+@lru_cache(maxsize=None)
+def _cell_id_matrix(size):
+    """Cell IDs of a grid as [row][col], e.g. ids[0][0] == 'A1'"""
+    squares = initialize_structures(size)[2]
+    return tuple(squares[i*size:(i+1)*size] for i in range(size))
+
+# Solver progress is redrawn at most every UPDATE_INTERVAL seconds or UPDATE_EVERY steps
+UPDATE_INTERVAL = 0.1
+UPDATE_EVERY = 50
+
+# Grid number of a cell value: digits as themselves, letters from 10 up, blanks as 0
+CHAR_TO_INT = {c: i for i, c in enumerate('.123456789ABCDEFGHIJKLMNOPQRSTUVWXYZ')}
+CHAR_TO_INT['0'] = 0
+
+def dict_to_numpy(values, size):
+    """Integer grid of a {cell_id: char} dict, with 0 for blank or missing cells"""
+    ids = _cell_id_matrix(size)
+    return np.array([[CHAR_TO_INT.get(values.get(ids[i][j], '0'), 0) for j in range(size)]
+                     for i in range(size)], dtype=int)
 
 def display_sudoku(grid, is_solution=False, original_grid=None, size=9):
     """Render Sudoku grid with error highlighting"""
-    rows, cols, squares, unitlist, units, peers, subgrid_rows, subgrid_cols, digits = initialize_structures(size)
+    *_, subgrid_rows, subgrid_cols, _ = initialize_structures(size)
+    ids = _cell_id_matrix(size)
     
+    # Integer grid for the rule checks: the ndarray input as is, or built once from a dict
+    temp_grid = None
     if isinstance(grid, np.ndarray):
+        temp_grid = grid
         grid_dict = {}
         for i in range(size):
             for j in range(size):
-                cell_id = f"{rows[i]}{cols[j]}"
+                cell_id = ids[i][j]
                 value = grid[i,j] if grid[i,j] != 0 else ''
                 grid_dict[cell_id] = str(value) if value != '' else ''
         grid = grid_dict
@@ -94,15 +119,28 @@ def display_sudoku(grid, is_solution=False, original_grid=None, size=9):
         original_dict = {}
         for i in range(size):
             for j in range(size):
-                cell_id = f"{rows[i]}{cols[j]}"
+                cell_id = ids[i][j]
                 value = original_grid[i,j] if original_grid[i,j] != 0 else ''
                 original_dict[cell_id] = str(value) if value != '' else ''
     
-    html = '<div class="sudoku-container"><div class="sudoku-grid">'
+    # Check every cell against the Sudoku rules at once for error highlighting
+    error_mask = None
+    if not is_solution and original_dict:
+        if temp_grid is None:
+            temp_grid = np.zeros((size,size), dtype=int)
+            for r in range(size):
+                for c in range(size):
+                    cell = ids[r][c]
+                    val = grid.get(cell, '0')
+                    temp_grid[r,c] = int(val) if val not in ['', '.', '0'] else 0
+        error_mask = compute_error_mask(temp_grid, subgrid_rows, subgrid_cols)
+    
+    borders = _cell_templates(size, subgrid_rows, subgrid_cols)
+    parts = ['<div class="sudoku-container"><div class="sudoku-grid">']
     for i in range(size):
-        html += '<div class="sudoku-row">'
+        parts.append('<div class="sudoku-row">')
         for j in range(size):
-            cell_id = f"{rows[i]}{cols[j]}"
+            cell_id = ids[i][j]
             value = grid.get(cell_id, '')
             display_value = value if value not in ['', '0', '.'] else ''
             
@@ -119,25 +157,16 @@ def display_sudoku(grid, is_solution=False, original_grid=None, size=9):
             # Mark errors in intermediate solutions
             if not is_solution and original_dict and value not in ['', '0', '.']:
                 if original_dict.get(cell_id, '') in ['', '0', '.']:  # Only check filled cells
-                    # Convert to numpy array for checking
-                    temp_grid = np.zeros((size,size), dtype=int)
-                    for r in range(size):
-                        for c in range(size):
-                            cell = f"{rows[r]}{cols[c]}"
-                            val = grid.get(cell, '0')
-                            temp_grid[r,c] = int(val) if val not in ['', '.', '0'] else 0
-                    
-                    if is_incorrect(temp_grid, i, j, int(value), size, subgrid_rows, subgrid_cols):
+                    if error_mask[i, j]:
                         classes += " error"
             
             # Add thick borders
-            classes += " border-right-thick" if (j+1) % subgrid_cols == 0 and j != size-1 else ""
-            classes += " border-bottom-thick" if (i+1) % subgrid_rows == 0 and i != size-1 else ""
+            classes += borders[i][j]
             
-            html += f'<div class="{classes}">{display_value}</div>'
-        html += '</div>'
-    html += '</div></div>'
-    return html
+            parts.append(f'<div class="{classes}">{display_value}</div>')
+        parts.append('</div>')
+    parts.append('</div></div>')
+    return "".join(parts)
 
 def parse_puzzle(content):
     """Parse puzzle input that starts with size and has space-separated values"""
@@ -172,6 +201,14 @@ def parse_puzzle(content):
     
     return size, puzzle_str
 
+@st.cache_data
+def parse_and_build(raw_text):
+    """Parse puzzle text into its size, puzzle string, cell dict and integer grid.
+    Cached on the text, so reruns from other widgets skip the parse and grid build."""
+    size, puzzle_str = parse_puzzle(raw_text)
+    puzzle_dict = grid_values(f"{size}\n{puzzle_str}", size)
+    return size, puzzle_str, puzzle_dict, dict_to_numpy(puzzle_dict, size)
+
 # Streamlit UI
 st.title("🧩 Variable-Size Sudoku Solver")
 
@@ -200,26 +237,21 @@ sample_puzzles = {
 }
 
 puzzle_choice = st.selectbox("Or try sample puzzle:", list(sample_puzzles.keys()))
-puzzle_size, puzzle_str  = parse_puzzle(sample_puzzles[puzzle_choice]) if puzzle_choice != "Select sample puzzle" else (9, "")
+content = sample_puzzles[puzzle_choice]
+puzzle_size, puzzle_str = 9, ""
 
 if uploaded_file:
     content = uploaded_file.read().decode("utf-8")
+
+if content:
     try:
-        puzzle_size, puzzle_str = parse_puzzle(content)
+        puzzle_size, puzzle_str, puzzle_dict, puzzle_grid = parse_and_build(content)
     except ValueError as e:
         st.error(f"Invalid puzzle input: {e}")
         st.stop()
 
 if puzzle_str:
     rows, cols, squares, *_ = initialize_structures(puzzle_size)
-    puzzle_dict = grid_values(f"{puzzle_size}\n{puzzle_str}", puzzle_size)
-    
-    puzzle_grid = np.zeros((puzzle_size, puzzle_size), dtype=int)
-    for i in range(puzzle_size):
-        for j in range(puzzle_size):
-            cell = f"{rows[i]}{cols[j]}"
-            val = puzzle_dict.get(cell, '0')
-            puzzle_grid[i,j] = int(val) if val.isdigit() else 0
     
     st.subheader("Original Puzzle")
     st.markdown(display_sudoku(puzzle_grid, size=puzzle_size), unsafe_allow_html=True)
@@ -238,83 +270,56 @@ if puzzle_str:
                     st.error("Unexpected solution format")
                     st.stop()
                 
-                solution_grid = np.zeros((puzzle_size, puzzle_size), dtype=int)
-                for i in range(puzzle_size):
-                    for j in range(puzzle_size):
-                        cell = f"{rows[i]}{cols[j]}"
-                        val = solution_dict.get(cell, '0')
-                        # Handle both digit strings and letters
-                        if val.isdigit():
-                            solution_grid[i,j] = int(val)
-                        elif val in 'ABCDEFGHIJKLMNOPQRSTUVWXYZ':
-                            solution_grid[i,j] = 10 + ord(val.upper()) - ord('A')
-                        else:
-                            solution_grid[i,j] = 0
+                # Handle both digit strings and letters
+                solution_grid = dict_to_numpy(solution_dict, puzzle_size)
                 
                 st.subheader("Solution")
                 st.markdown(display_sudoku(solution_grid, is_solution=True, size=puzzle_size), unsafe_allow_html=True)
                 st.success(f"Solved in {time.time() - start_time:.2f} seconds!")
             
-            elif method == "Ant Colony Optimization":
-                solver = ACOSolver(puzzle_dict, puzzle_size)
-                progress_bar = st.progress(0)
-                time_text = st.empty()
-                fitness_text = st.empty()
-                solution_placeholder = st.empty()
-                
-                for solution, fitness in solver.solve():
-                    progress_bar.progress(int(fitness * 100))
-                    time_text.text(f"Elapsed time: {time.time() - start_time:.2f}s")
-                    fitness_text.text(f"Fitness: {fitness:.4f}")
-                    
-                    solution_grid = np.zeros((puzzle_size, puzzle_size), dtype=int)
-                    for i in range(puzzle_size):
-                        for j in range(puzzle_size):
-                            cell = f"{rows[i]}{cols[j]}"
-                            val = solution.get(cell, '0') if isinstance(solution, dict) else solution[i,j]
-                            solution_grid[i,j] = int(val) if str(val).isdigit() else 0
-                    
-                    solution_placeholder.markdown(
-                        display_sudoku(solution_grid, original_grid=puzzle_grid, size=puzzle_size), 
-                        unsafe_allow_html=True
-                    )
-                    
-                    if fitness >= 0.999:
-                        st.success(f"Solved in {time.time() - start_time:.2f} seconds!")
-                        break
-            
-            else:  # ABC methods
-                solver = HybridABCSolver(puzzle_dict, puzzle_size) if "Hybrid" in method else ABCSolver(puzzle_dict, puzzle_size)
+            else:  # Metaheuristics stream their best solution so far
+                if method == "Ant Colony Optimization":
+                    solver = ACOSolver(puzzle_dict, puzzle_size)
+                elif "Hybrid" in method:
+                    solver = HybridABCSolver(puzzle_dict, puzzle_size)
+                else:
+                    solver = ABCSolver(puzzle_dict, puzzle_size)
                 progress_bar = st.progress(0)
                 time_text = st.empty()
                 fitness_text = st.empty()
                 solution_placeholder = st.empty()
                 
-                for solution, fitness in solver.solve():
+                def show_progress(solution, fitness):
+                    """Render one intermediate solution and its fitness into the placeholders"""
                     progress_bar.progress(int(fitness * 100))
                     time_text.text(f"Elapsed time: {time.time() - start_time:.2f}s")
                     fitness_text.text(f"Fitness: {fitness:.4f}")
                     
-                    solution_grid = np.zeros((puzzle_size, puzzle_size), dtype=int)
                     if isinstance(solution, dict):
-                        for i in range(puzzle_size):
-                            for j in range(puzzle_size):
-                                cell = f"{rows[i]}{cols[j]}"
-                                val = solution.get(cell, '0')
-                                solution_grid[i,j] = int(val) if str(val).isdigit() else 0
+                        solution_grid = dict_to_numpy(solution, puzzle_size)
                     else:
                         solution_grid = solution
-                        
-                    
                     
                     solution_placeholder.markdown(
                         display_sudoku(solution_grid, original_grid=puzzle_grid, size=puzzle_size), 
                         unsafe_allow_html=True
                     )
+                
+                # Rendering costs far more than a solver step, so refresh only every UPDATE_EVERY
+                # steps or UPDATE_INTERVAL seconds, and always show the last solution
+                last_update, pending = 0.0, None
+                for step, (solution, fitness) in enumerate(solver.solve()):
+                    pending = (solution, fitness)
+                    solved = fitness >= 0.999
+                    if solved or step % UPDATE_EVERY == 0 or time.time() - last_update > UPDATE_INTERVAL:
+                        show_progress(solution, fitness)
+                        last_update, pending = time.time(), None
                     
-                    if fitness >= 0.999:
+                    if solved:
                         st.success(f"Solved in {time.time() - start_time:.2f} seconds!")
                         break
+                if pending:
+                    show_progress(*pending)
 
 st.markdown("---")
 st.caption("Sudoku Solver - Supporting variable grid sizes (6x6, 9x9, 12x12, etc.)")
\ No newline at end of file